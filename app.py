@@ -1,13 +1,86 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import os
+import json
 from datetime import datetime
-from collections import Counter
-import re
 
 # Конфигурация страницы
 st.set_page_config(page_title="Locks Analyser", page_icon="🔒", layout="wide")
 
+# Сколько отсутствующих строк перечислять в сообщении об ошибке
+MAX_MISSING_SHOWN = 100
+
+# Файлы с ошибками разбора крупнее этого размера валидируются по частям
+CHUNKED_VALIDATION_BYTES = 100 * 1024 * 1024
+CSV_CHUNK_ROWS = 100_000
+
+# Типы колонок для чтения уже проверенного файла: номер строки + 6 значений
+CSV_DTYPES = {0: np.int32, **{col: "Int32" for col in range(1, 7)}}
+
+# Номер строки - целое число до 6 цифр (000000-999999)
+ROW_NUMBER_PATTERN = r"\d{1,6}"
+MAX_ROW_NUMBER = 999_999
+
+# Таблицы для чисел 0-99: разность цифр и зеркальное число
+_TENS, _ONES = np.divmod(np.arange(100), 10)
+DIGIT_DIFF = np.abs(_TENS - _ONES).astype(np.int8)
+MIRROR = (_ONES * 10 + _TENS).astype(np.int8)
+
+
+def _to_arrays(df, ids, nums):
+    """Числовое представление уже проверенных данных: номера строк и значения
+
+    ids и nums - разобранные номера строк и значения (пустые - NaN), валидация
+    их уже прошла. Строки упорядочиваются по номеру, чтобы поиск шел через
+    np.searchsorted.
+    """
+    ids = ids.to_numpy(dtype=np.int32)
+    vals = np.nan_to_num(nums, nan=0).astype(np.int16)  # Пустые значения -> 0
+    if np.any(ids[1:] < ids[:-1]):
+        order = np.argsort(ids, kind="stable")
+        df = df.iloc[order].reset_index(drop=True)
+        ids = ids[order]
+        vals = vals[order]
+
+    return df, ids, vals
+
+
+@st.cache_data(ttl=None, show_spinner=False)
+def _load_and_validate(mtime, size):
+    """Чтение, валидация и разбор CSV файла (кэшируется до изменения файла)"""
+    if size > CHUNKED_VALIDATION_BYTES:
+        # Большой файл проверяем как текст по частям. После проверки все
+        # ячейки - целые числа в допустимом диапазоне, и файл можно читать
+        # сразу в целочисленные колонки (лишние колонки не читаем)
+        row_count, errors = _validate_chunked()
+        if errors:
+            # Для вывода ошибок нужно только число строк файла
+            return pd.DataFrame(index=pd.RangeIndex(row_count)), None, None, errors
+
+        df = pd.read_csv(
+            "data.csv",
+            header=None,
+            usecols=list(CSV_DTYPES),
+            dtype=CSV_DTYPES,
+            engine="c",
+        )
+        nums = df.iloc[:, 1:7].to_numpy(dtype=np.float64, na_value=np.nan)
+        df, ids, vals = _to_arrays(df, df[0], nums)
+        return df, ids, vals, errors
+
+    # Валидация идет по тексту: при чтении в целочисленные колонки "12.0"
+    # не отличить от "12", а слишком большие числа молча переполняются
+    df = pd.read_csv("data.csv", header=None, dtype=str, engine="c")
+    parsed, errors = validate_data(df)
+    if errors:
+        # С ошибками анализ не выполняется - массивы не нужны
+        return df, None, None, errors
+
+    # Массивы строим из значений, разобранных при валидации
+    df, ids, vals = _to_arrays(df, *parsed)
+    return df, ids, vals, errors
+
 
 def load_data():
     """Загрузка данных из CSV файла"""
@@ -15,11 +88,26 @@ def load_data():
         return None, "Файл data.csv не найден!"
 
     try:
-        df = pd.read_csv("data.csv", header=None, dtype=str)
-        return df, None
+        file_key = get_file_key()
+        # Повторные запуски сессии берут данные из session_state: кэш
+        # st.cache_data при каждом обращении заново копирует таблицу и массивы
+        if st.session_state.get("data_key") == file_key:
+            return st.session_state["data"], None
+
+        data = _load_and_validate(*file_key)
     except Exception as e:
         return None, f"Ошибка при чтении файла data.csv: {str(e)}"
 
+    st.session_state["data_key"] = file_key
+    st.session_state["data"] = data
+    return data, None
+
+
+def get_file_key():
+    """Версия файла для кэширования (время изменения и размер)"""
+    stat = os.stat("data.csv")
+    return stat.st_mtime, stat.st_size
+
 
 def get_file_info():
     """Получение информации о файле"""
@@ -39,102 +127,196 @@ def normalize_row_number(row_num):
         return None
 
 
-def validate_data(df):
-    """Валидация данных CSV файла"""
-    errors = []
+def _row_labels(row_numbers):
+    """Номера строк для сообщений (числовые номера приводим к 6-значному виду)"""
+    labels = row_numbers.astype(str)
+    if pd.api.types.is_integer_dtype(row_numbers):
+        labels = labels.str.zfill(6)
+    return labels
 
-    # Проверка структуры
-    if df.shape[1] < 7:
-        errors.append(
-            "Недостаточно колонок в файле. Ожидается минимум 7 колонок (номер строки + 6 значений)"
-        )
-        return errors
-
-    # Проверка дубликатов номеров строк
-    row_numbers = df[0].tolist()
-    duplicates = [item for item, count in Counter(row_numbers).items() if count > 1]
-    if duplicates:
-        errors.append(f"Найдены дублирующиеся номера строк: {', '.join(duplicates)}")
-
-    # Проверка двузначных значений
-    for idx, row in df.iterrows():
-        row_num = row[0]
-        for col_idx in range(1, 7):  # Проверяем колонки 1-6
-            if col_idx < len(row):
-                value = str(row[col_idx]).strip()
-                if value and value != "nan":  # Пропускаем пустые значения
-                    try:
-                        num_val = int(value)
-                        if num_val < 10 or num_val > 99:
-                            errors.append(
-                                f"Строка {row_num}, позиция {col_idx}: значение '{value}' не является двузначным числом"
-                            )
-                    except ValueError:
-                        errors.append(
-                            f"Строка {row_num}, позиция {col_idx}: значение '{value}' не является числом"
-                        )
-            else:
-                errors.append(
-                    f"Строка {row_num}: отсутствует значение в позиции {col_idx}"
-                )
 
-    return errors
+def _duplicate_errors(row_numbers):
+    """Проверка дубликатов номеров строк"""
+    # Пустые и некорректные номера (NA) проверяются отдельно
+    duplicated = row_numbers.duplicated(keep=False) & row_numbers.notna()
+    if not duplicated.any():
+        return []
+
+    duplicates = _row_labels(row_numbers[duplicated]).unique().tolist()
+    return [f"Найдены дублирующиеся номера строк: {', '.join(duplicates)}"]
 
 
-def check_range_integrity(df, start_num, end_num):
-    """Проверка целостности диапазона"""
-    missing_rows = []
-    existing_rows = set(df[0].astype(str).tolist())
+def _row_number_errors(row_numbers):
+    """Проверка формата номеров строк
 
-    for i in range(int(start_num), int(end_num) + 1):
-        row_num = f"{i:06d}"
-        if row_num not in existing_rows:
-            missing_rows.append(row_num)
+    Возвращает числовые номера (пустые и некорректные - NA) и ошибки.
+    """
+    text = row_numbers.astype(str).str.strip()
+    empty = row_numbers.isna() | (text == "")
+    valid = text.str.fullmatch(ROW_NUMBER_PATTERN) & ~empty
+
+    errors = []
+    if empty.any():
+        # Номера нет - указываем строку файла (нумерация с 1)
+        lines = (row_numbers.index[empty] + 1).astype(str).tolist()
+        errors.append(f"Отсутствует номер строки в строках файла: {', '.join(lines)}")
+
+    invalid = ~valid & ~empty
+    if invalid.any():
+        labels = text[invalid].unique().tolist()
+        errors.append(f"Некорректные номера строк: {', '.join(labels)}")
+
+    ids = pd.to_numeric(text.where(valid), errors="coerce").astype("Int64")
+    return ids, errors
+
+
+def _value_errors(df):
+    """Проверка двузначных значений (по колонкам, без обхода строк)
+
+    Возвращает разобранные значения (float, пустые - NaN) и ошибки.
+    """
+    values = df.iloc[:, 1:7]
+    text = values.astype(str).apply(lambda col: col.str.strip())
+    nums = text.apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+    filled = (values.notna() & (text != "")).to_numpy()  # Пропускаем пустые
+    is_integer = text.apply(lambda col: col.str.fullmatch(r"[+-]?\d+"))
+    bad_numeric = filled & (np.isnan(nums) | ~is_integer.to_numpy(dtype=bool))
+
+    # Пустые значения (NaN) в сравнениях дают False и не считаются ошибкой
+    bad_range = ~bad_numeric & ((nums < 10) | (nums > 99))
+    bad = bad_numeric | bad_range
+    if not bad.any():
+        return nums, []
+
+    # Сообщения формируем только для ошибочных ячеек
+    errors = []
+    row_labels = _row_labels(df[0])
+    for row_idx, col_idx in np.argwhere(bad):
+        row_num = row_labels.iat[row_idx]
+        value = text.iat[row_idx, col_idx]
+        if bad_numeric[row_idx, col_idx]:
+            errors.append(
+                f"Строка {row_num}, позиция {col_idx + 1}: значение '{value}' не является числом"
+            )
+        else:
+            errors.append(
+                f"Строка {row_num}, позиция {col_idx + 1}: значение '{value}' не является двузначным числом"
+            )
 
-    return missing_rows
+    return nums, errors
 
 
-def get_single_row(df, row_number):
+def validate_data(df):
+    """Валидация данных CSV файла
+
+    Возвращает разобранные номера строк и значения (None, если структура
+    файла неверна) и список ошибок.
+    """
+    errors = []
+
+    # Проверка структуры
+    if df.shape[1] < 7:
+        errors.append(
+            "Недостаточно колонок в файле. Ожидается минимум 7 колонок (номер строки + 6 значений)"
+        )
+        return None, errors
+
+    ids, row_errors = _row_number_errors(df[0])
+    errors.extend(row_errors)
+    # Дубликаты ищем по числовым номерам: "1002" и "001002" - одна строка
+    errors.extend(_duplicate_errors(ids))
+
+    nums, value_errors = _value_errors(df)
+    errors.extend(value_errors)
+    return (ids, nums), errors
+
+
+def _validate_chunked():
+    """Валидация большого файла по частям, без загрузки всего текста в память
+
+    Возвращает число строк файла и список ошибок.
+    """
+    value_errors = []
+    row_ids = []
+    bad_row_numbers = []
+    row_count = 0
+    reader = pd.read_csv("data.csv", header=None, dtype=str, chunksize=CSV_CHUNK_ROWS)
+    for chunk in reader:
+        row_count += len(chunk)
+        if chunk.shape[1] < 7:
+            # Остаток файла только досчитываем до полного числа строк
+            row_count += sum(len(rest) for rest in reader)
+            return row_count, validate_data(chunk)[1]
+
+        # От каждой части сохраняем только числовые номера строк и текст
+        # ошибочных номеров (пустые и некорректные дают NA)
+        ids, _ = _row_number_errors(chunk[0])
+        row_ids.append(ids)
+        bad_row_numbers.append(chunk[0][ids.isna()])
+        value_errors.extend(_value_errors(chunk)[1])
+
+    # Сообщения о номерах строк и дубликаты - по всем частям сразу
+    _, row_errors = _row_number_errors(pd.concat(bad_row_numbers))
+    duplicate_errors = _duplicate_errors(pd.concat(row_ids))
+    return row_count, row_errors + duplicate_errors + value_errors
+
+
+def check_range_integrity(ids, start_num, end_num, limit=MAX_MISSING_SHOWN):
+    """Проверка целостности диапазона
+
+    ids - отсортированные номера строк внутри диапазона, без повторов
+    (проверено валидацией). Возвращает первые limit отсутствующих номеров
+    и общее число отсутствующих - весь диапазон при этом не создается.
+    """
+    start, end = int(start_num), int(end_num)
+    missing_count = (end - start + 1) - ids.size
+    if missing_count == 0:  # Все номера на месте
+        return np.empty(0, dtype=np.int64), 0
+
+    # Пропуски между соседними номерами (границы диапазона - по краям)
+    bounds = np.concatenate(([start - 1], ids, [end + 1])).astype(np.int64)
+    missing = []
+    for i in np.flatnonzero(np.diff(bounds) > 1).tolist():
+        first, stop = int(bounds[i]) + 1, int(bounds[i + 1])
+        missing.extend(range(first, min(stop, first + limit - len(missing))))
+        if len(missing) >= limit:
+            break
+
+    return np.array(missing, dtype=np.int64), missing_count
+
+
+def get_single_row(df, ids, row_number):
     """Получение одной строки по номеру"""
     normalized_num = normalize_row_number(row_number)
     if not normalized_num:
         return None, "Некорректный номер строки"
 
-    row_data = df[df[0] == normalized_num]
-    if row_data.empty:
+    row_id = int(normalized_num)
+    if not 0 <= row_id <= MAX_ROW_NUMBER:  # Номера строк шестизначные
+        return None, "Некорректный номер строки"
+
+    # ids отсортированы, поэтому поиск двоичный - O(log N) без словаря
+    pos = np.searchsorted(ids, row_id)
+    if pos == ids.size or ids[pos] != row_id:
         return None, f"Строка {normalized_num} не найдена"
 
-    return row_data.iloc[0], None
+    return df.iloc[pos], None
 
 
-def calculate_digit_difference(num):
-    """Вычисление разности цифр двузначного числа"""
-    if pd.isna(num) or str(num).strip() == "":
-        return None
-    try:
-        num_str = str(int(num))
-        if len(num_str) == 2:
-            return abs(int(num_str[0]) - int(num_str[1]))
-        else:
-            return None
-    except:
-        return None
+def _count_numbers(values, is_skat=False):
+    """Гистограмма двузначных чисел (индекс - число, 0-99)"""
+    # Булева маска по 2D-срезу сразу дает плоский массив (без копии через ravel)
+    values = values[(values >= 10) & (values <= 99)]  # Двузначные числа
+    counts = np.bincount(values, minlength=100)
 
+    # В режиме СКАТ добавляем зеркальные числа
+    if is_skat:
+        counts += np.bincount(MIRROR[values], minlength=100)
 
-def is_mirror_number(num):
-    """Проверка, является ли число зеркальным"""
-    if pd.isna(num) or str(num).strip() == "":
-        return False
-    try:
-        num_str = str(int(num))
-        if len(num_str) == 2:
-            return num_str[0] == num_str[1]
-        return False
-    except:
-        return False
+    return counts
 
 
-def analyze_range(df, start_range, end_range, is_skat=False):
+def analyze_range(ids, vals, start_range, end_range, is_skat=False):
     """Анализ диапазона строк"""
     start_num = normalize_row_number(start_range)
     end_num = normalize_row_number(end_range)
@@ -142,131 +324,148 @@ def analyze_range(df, start_range, end_range, is_skat=False):
     if not start_num or not end_num:
         return None, "Некорректный формат диапазона"
 
-    if int(start_num) > int(end_num):
-        return None, "Начало диапазона не может быть больше конца"
+    start, end = int(start_num), int(end_num)
+    # Номера строк шестизначные (большие границы к тому же не помещаются в int64)
+    if not (0 <= start <= MAX_ROW_NUMBER and 0 <= end <= MAX_ROW_NUMBER):
+        return None, "Некорректный формат диапазона"
 
-    # Проверка целостности диапазона
-    missing_rows = check_range_integrity(df, start_num, end_num)
-    if missing_rows:
-        return None, f"В диапазоне отсутствуют строки: {', '.join(missing_rows)}"
+    if start > end:
+        return None, "Начало диапазона не может быть больше конца"
 
-    # Фильтрация данных по диапазону
-    df_filtered = df[
-        (df[0].astype(str) >= start_num) & (df[0].astype(str) <= end_num)
-    ].copy()
+    # Границы диапазона в отсортированных номерах строк
+    lo, hi = np.searchsorted(ids, [start, end + 1]).tolist()
 
-    if df_filtered.empty:
+    # Проверка целостности диапазона
+    missing_rows, missing_count = check_range_integrity(ids[lo:hi], start, end)
+    if missing_count:
+        # Форматируем только начало списка, чтобы сообщение оставалось читаемым
+        shown = ", ".join(np.char.zfill(missing_rows.astype(str), 6))
+        hidden = missing_count - missing_rows.size
+        if hidden > 0:
+            shown += f" (и ещё {hidden})"
+        return None, f"В диапазоне отсутствуют строки: {shown}"
+
+    if lo == hi:
         return None, "Нет данных в указанном диапазоне"
 
     # Определяем количество колонок для анализа
     cols_to_analyze = 5 if is_skat else 6
 
     # Подсчет всех чисел
-    number_counts = {}
-    special_numbers = [11, 22, 33, 44, 55, 66, 77]
-
-    for _, row in df_filtered.iterrows():
-        for col_idx in range(1, cols_to_analyze + 1):
-            if col_idx < len(row):
-                try:
-                    value = int(row[col_idx])
-                    if 10 <= value <= 99:  # Двузначное число
-                        # Добавляем исходное число
-                        if value not in number_counts:
-                            number_counts[value] = 0
-                        number_counts[value] += 1
-
-                        # В режиме СКАТ добавляем зеркальное число
-                        if is_skat:
-                            mirror_value = get_mirror_pair(value)
-                            if mirror_value:  # Убираем проверку на отличие от исходного
-                                if mirror_value not in number_counts:
-                                    number_counts[mirror_value] = 0
-                                number_counts[mirror_value] += 1
-                except:
-                    continue
+    counts = _count_numbers(vals[lo:hi, :cols_to_analyze], is_skat)
 
     # Группировка по штампам (разности цифр)
+    present = np.flatnonzero(counts[10:]) + 10
     stamps = {}
-    for number, count in number_counts.items():
-        diff = calculate_digit_difference(number)
-        if diff is not None:
-            if diff not in stamps:
-                stamps[diff] = {}
+    for number, diff in zip(present.tolist(), DIGIT_DIFF[present].tolist()):
+        if diff not in stamps:
+            stamps[diff] = {}
 
-            # В режиме СКАТ все числа умножаются на 2 (зеркалирование уже учтено)
-            # В обычном режиме тоже все числа умножаются на 2
-            display_count = count * 2
+        # В режиме СКАТ все числа умножаются на 2 (зеркалирование уже учтено)
+        # В обычном режиме тоже все числа умножаются на 2
+        display_count = int(counts[number]) * 2
 
-            stamps[diff][number] = display_count
+        stamps[diff][number] = display_count
 
     return stamps, None
 
 
-def get_mirror_pair(number):
-    """Получение зеркального числа"""
-    num_str = str(number)
-    if len(num_str) == 2:
-        return int(num_str[1] + num_str[0])
-    return None
-
-
 def format_stamp_display(stamp_data):
     """Форматирование данных штампа для отображения"""
     if not stamp_data:
         return []
 
-    processed_numbers = set()
-    lines = []
+    # Сортируем числа по возрастанию и находим зеркальные пары
+    numbers = np.array(sorted(stamp_data))
+    mirrors = MIRROR[numbers]
+    # Пара есть, если зеркальное число присутствует и не совпадает с исходным
+    paired = np.isin(mirrors, numbers) & (mirrors != numbers)
 
-    # Сортируем числа по возрастанию
-    for number in sorted(stamp_data.keys()):
-        if number in processed_numbers:
-            continue
-
-        count = stamp_data[number]
-        mirror = get_mirror_pair(number)
-
-        # Проверяем, есть ли зеркальная пара и не является ли число само себе зеркальным
-        if (
-            mirror
-            and mirror != number
-            and mirror in stamp_data
-            and mirror not in processed_numbers
-        ):
-
-            mirror_count = stamp_data[mirror]
-            lines.append(f"{number} ({count}шт) ⇄ {mirror} ({mirror_count}шт)")
-            processed_numbers.add(number)
-            processed_numbers.add(mirror)
-        else:
-            lines.append(f"{number} ({count}шт)")
-            processed_numbers.add(number)
+    lines = []
+    for number, mirror, has_pair in zip(
+        numbers.tolist(), mirrors.tolist(), paired.tolist()
+    ):
+        if not has_pair:
+            lines.append(f"{number} ({stamp_data[number]}шт)")
+        elif number < mirror:  # Пара выводится один раз, на меньшем числе
+            lines.append(
+                f"{number} ({stamp_data[number]}шт) ⇄ {mirror} ({stamp_data[mirror]}шт)"
+            )
 
     return lines
 
 
-def format_results_for_copy(stamps, is_skat=False):
-    """Форматирование результатов для копирования"""
-    text = []
-    text.append("=== РЕЗУЛЬТАТЫ АНАЛИЗА ===")
-    text.append("")
+def _emit_lines(ordered_stamps, is_skat=False):
+    """Построчная генерация текста результатов"""
+    yield "=== РЕЗУЛЬТАТЫ АНАЛИЗА ==="
+    yield ""
 
     mode = "СКАТ" if is_skat else "Обычный"
-    text.append(f"Режим: {mode}")
-    text.append("")
+    yield f"Режим: {mode}"
+    yield ""
 
-    # Сортируем штампы по номеру
-    for stamp_num in sorted(stamps.keys()):
-        stamp_data = stamps[stamp_num]
+    for stamp_num, stamp_data in ordered_stamps:
         if stamp_data:  # Если в штампе есть данные
-            text.append(f"Штамп: {stamp_num}")
-            lines = format_stamp_display(stamp_data)
-            for line in lines:
-                text.append(line)
-            text.append("")
-
-    return "\n".join(text).rstrip()
+            yield f"Штамп: {stamp_num}"
+            yield from format_stamp_display(stamp_data)
+            yield ""
+
+
+def format_results_for_copy(ordered_stamps, is_skat=False):
+    """Форматирование результатов для копирования (штампы отсортированы по номеру)"""
+    return "\n".join(_emit_lines(ordered_stamps, is_skat)).rstrip()
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def build_copy_html(formatted_text):
+    """HTML кнопки копирования результатов в буфер обмена"""
+    # Строковый литерал JavaScript с текстом результатов
+    js_text = json.dumps(formatted_text)
+    return f"""
+    <script>
+    function copyToClipboard() {{
+        const text = {js_text};
+        if (navigator.clipboard && navigator.clipboard.writeText) {{
+            navigator.clipboard.writeText(text).then(function() {{
+                alert('Результаты скопированы в буфер обмена!');
+            }}).catch(function() {{
+                fallbackCopy(text);
+            }});
+        }} else {{
+            fallbackCopy(text);
+        }}
+    }}
+    
+    function fallbackCopy(text) {{
+        const textArea = document.createElement('textarea');
+        textArea.value = text;
+        textArea.style.position = 'fixed';
+        textArea.style.left = '-999999px';
+        textArea.style.top = '-999999px';
+        document.body.appendChild(textArea);
+        textArea.focus();
+        textArea.select();
+        try {{
+            document.execCommand('copy');
+            alert('Результаты скопированы в буфер обмена!');
+        }} catch (err) {{
+            prompt('Скопируйте текст:', text);
+        }}
+        document.body.removeChild(textArea);
+    }}
+    </script>
+    
+    <button onclick="copyToClipboard()" style="
+        background-color: #ff4b4b;
+        color: white;
+        border: none;
+        padding: 0.5rem 1rem;
+        border-radius: 0.25rem;
+        cursor: pointer;
+        font-size: 14px;
+        margin-top: 10px;
+    ">📋 Копировать результаты</button>
+    """
 
 
 def main():
@@ -275,17 +474,18 @@ def main():
 
     # Информация о файле
     file_mod_time = get_file_info()
-    df, load_error = load_data()
+    data, load_error = load_data()
 
     if load_error:
         st.error(load_error)
         st.stop()
 
+    df, ids, vals, validation_errors = data
+
     row_count = len(df)
     st.info(f"📄 Файл: data.csv | Обновлен: {file_mod_time} | Строк: {row_count}")
 
-    # Валидация данных
-    validation_errors = validate_data(df)
+    # Валидация данных (выполняется один раз при загрузке файла)
     if validation_errors:
         st.error("❌ Обнаружены ошибки в данных:")
         for error in validation_errors:
@@ -313,8 +513,29 @@ def main():
 
         if st.button("🔍 Анализировать диапазон", type="primary"):
             if start_range and end_range:
-                with st.spinner("Анализ данных..."):
-                    stamps, error = analyze_range(df, start_range, end_range, is_skat)
+                # Повторный анализ с теми же параметрами берем из session_state
+                results_key = (start_range, end_range, is_skat, get_file_key())
+                last_results = st.session_state.get("last_results")
+                if last_results and last_results[0] == results_key:
+                    _, ordered_stamps, formatted_text = last_results
+                    error = None
+                else:
+                    with st.spinner("Анализ данных..."):
+                        stamps, error = analyze_range(
+                            ids, vals, start_range, end_range, is_skat
+                        )
+
+                    if not error:
+                        # Сортируем штампы по номеру один раз для вывода и копирования
+                        ordered_stamps = sorted(stamps.items())
+                        formatted_text = format_results_for_copy(
+                            ordered_stamps, is_skat
+                        )
+                        st.session_state["last_results"] = (
+                            results_key,
+                            ordered_stamps,
+                            formatted_text,
+                        )
 
                 if error:
                     st.error(f"❌ {error}")
@@ -324,73 +545,17 @@ def main():
                     # Отображение результатов по штампам
                     st.subheader("📈 Результаты по штампам")
 
-                    # Сортируем штампы по номеру
-                    for stamp_num in sorted(stamps.keys()):
-                        stamp_data = stamps[stamp_num]
+                    # Все штампы выводим одним блоком markdown (каждая строка - абзац)
+                    blocks = []
+                    for stamp_num, stamp_data in ordered_stamps:
                         if stamp_data:  # Если в штампе есть данные
-                            st.write(f"**Штамп: {stamp_num}**")
-                            lines = format_stamp_display(stamp_data)
-                            for line in lines:
-                                st.write(line)
-                            st.write("")  # Пустая строка между штампами
+                            blocks.append(f"**Штамп: {stamp_num}**")
+                            blocks.extend(format_stamp_display(stamp_data))
+                            blocks.append("&nbsp;")  # Пустая строка между штампами
+                    st.markdown("\n\n".join(blocks))
 
                     # Кнопка копирования
-                    formatted_text = format_results_for_copy(stamps, is_skat)
-
-                    # JavaScript для копирования в буфер обмена
-                    escaped_text = (
-                        formatted_text.replace("\\", "\\\\")
-                        .replace("`", "\\`")
-                        .replace("\n", "\\n")
-                        .replace("\r", "\\r")
-                    )
-                    copy_script = f"""
-                    <script>
-                    function copyToClipboard() {{
-                        const text = `{escaped_text}`;
-                        if (navigator.clipboard && navigator.clipboard.writeText) {{
-                            navigator.clipboard.writeText(text).then(function() {{
-                                alert('Результаты скопированы в буфер обмена!');
-                            }}).catch(function() {{
-                                fallbackCopy(text);
-                            }});
-                        }} else {{
-                            fallbackCopy(text);
-                        }}
-                    }}
-                    
-                    function fallbackCopy(text) {{
-                        const textArea = document.createElement('textarea');
-                        textArea.value = text;
-                        textArea.style.position = 'fixed';
-                        textArea.style.left = '-999999px';
-                        textArea.style.top = '-999999px';
-                        document.body.appendChild(textArea);
-                        textArea.focus();
-                        textArea.select();
-                        try {{
-                            document.execCommand('copy');
-                            alert('Результаты скопированы в буфер обмена!');
-                        }} catch (err) {{
-                            prompt('Скопируйте текст:', text);
-                        }}
-                        document.body.removeChild(textArea);
-                    }}
-                    </script>
-                    
-                    <button onclick="copyToClipboard()" style="
-                        background-color: #ff4b4b;
-                        color: white;
-                        border: none;
-                        padding: 0.5rem 1rem;
-                        border-radius: 0.25rem;
-                        cursor: pointer;
-                        font-size: 14px;
-                        margin-top: 10px;
-                    ">📋 Копировать результаты</button>
-                    """
-
-                    st.components.v1.html(copy_script, height=100)
+                    st.components.v1.html(build_copy_html(formatted_text), height=100)
 
                     # Fallback - текстовое поле для ручного копирования
                     with st.expander(
@@ -407,11 +572,13 @@ def main():
 
         if st.button("👁️ Показать строку"):
             if row_number:
-                row_data, error = get_single_row(df, row_number)
+                row_data, error = get_single_row(df, ids, row_number)
                 if error:
                     st.error(f"❌ {error}")
                 else:
-                    st.success(f"✅ Строка найдена: {row_data[0]}")
+                    st.success(
+                        f"✅ Строка найдена: {normalize_row_number(row_data[0])}"
+                    )
 
                     # Создаем таблицу для отображения
                     display_data = []
@@ -443,7 +610,8 @@ def main():
         **Проверки данных:**
         - ✅ Целостность диапазона
         - ✅ Валидация двузначных чисел (10-99)
-        - ✅ Проверка дубликатов строк
+        - ✅ Проверка дубликатов строк (001234 и 1234 - одна и та же строка)
+        - ✅ Номера строк: обязательны, до 6 цифр (000000-999999)
         """
         )
 